@@ -8,14 +8,196 @@ For details, see : http://adsabs.harvard.edu/abs/2004PASP..116..133L
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import multiprocessing
+
+try:
+    from functools import lru_cache
+except ImportError:        # Python 2
+    def lru_cache(maxsize=None):
+        def decorator(func):
+            return func
+        return decorator
+
 import numpy as np
 from . import ZScaleInterval
 
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+try:
+    import numexpr
+    HAS_NUMEXPR = True
+except ImportError:
+    HAS_NUMEXPR = False
+
+try:
+    import cupy
+    HAS_CUPY = True
+except ImportError:
+    HAS_CUPY = False
+
+
+def _is_gpu_array(array):
+    """Return whether ``array`` is a cupy array resident on a GPU."""
+    return HAS_CUPY and isinstance(array, cupy.ndarray)
+
+
+def _as_float32(array):
+    """
+    Return ``array`` as a contiguous float32 ndarray.
+
+    Callers that already hold contiguous float32 data get it back
+    untouched, skipping both the copy and any float64 promotion.
+    """
+    if (isinstance(array, np.ndarray) and array.dtype == np.float32 and
+            array.flags.c_contiguous):
+        return array
+    return np.ascontiguousarray(array, dtype=np.float32)
+
 
 __all__ = ['make_lupton_rgb']
 
+_ASINH_LUT_SIZE = 4096
 
-def compute_intensity(image_r, image_g=None, image_b=None):
+# the asinh lookup table covers intensities with I*soften in [0, _ASINH_LUT_UMAX];
+# all of the curvature of arcsinh(u)/u lies at u of order unity, and with 4096
+# entries this range keeps the linear-interpolation error below ~1e-4 for any Q.
+# Brighter pixels fall back to the exact expression.
+_ASINH_LUT_UMAX = 256.0
+
+# number of image rows processed per block in Mapping._convert_images_to_uint8;
+# 64 rows of float32 scratch stay resident in L2 cache for typical image
+# widths, so the whole subtract/intensity/scale/clip chain runs from cache
+_TILE_NROWS = 64
+
+# below this many pixels per image the thread-dispatch overhead outweighs
+# any gain from processing row blocks in parallel
+_PARALLEL_MIN_PIXELS = 1 << 20
+
+
+@lru_cache(maxsize=32)
+def _bilinear_indices(src_shape, dst_shape):
+    """
+    Return the 1-D source indices and fractional weights for a bilinear
+    resample from ``src_shape`` to ``dst_shape`` (both (height, width)).
+
+    The geometry depends only on the two sizes, so it is cached: repeated
+    resizes at the same size (cutout services, mosaics) skip the setup.
+    """
+    src_h, src_w = src_shape
+    dst_h, dst_w = dst_shape
+
+    # half-pixel-centre convention, as used by Pillow and friends
+    ys = (np.arange(dst_h) + 0.5)*(src_h/dst_h) - 0.5
+    xs = (np.arange(dst_w) + 0.5)*(src_w/dst_w) - 0.5
+    np.clip(ys, 0, src_h - 1, out=ys)
+    np.clip(xs, 0, src_w - 1, out=xs)
+
+    yi = ys.astype(np.int32)
+    xi = xs.astype(np.int32)
+    wy = (ys - yi).astype(np.float32)
+    wx = (xs - xi).astype(np.float32)
+    return yi, xi, wy, wx
+
+
+def _resize_image(image, x_size=None, y_size=None, rescale=None):
+    """
+    Bilinearly resample an image, with cached per-size geometry.
+
+    The target size may be given explicitly as ``x_size``/``y_size`` (if
+    only one is given, the other is chosen to preserve the aspect ratio),
+    or as a single ``rescale`` factor applied to both dimensions. All
+    channels of an (H, W, 3) image are resampled in one pass.
+    """
+    height, width = image.shape[:2]
+    if rescale is not None:
+        if x_size is not None or y_size is not None:
+            raise ValueError("please specify either rescale or "
+                             "x_size/y_size, but not both.")
+        x_size = int(width*rescale)
+        y_size = int(height*rescale)
+    elif x_size is None:
+        x_size = int(width*y_size/height)
+    elif y_size is None:
+        y_size = int(height*x_size/width)
+
+    yi, xi, wy, wx = _bilinear_indices((height, width), (y_size, x_size))
+    yi1 = np.minimum(yi + 1, height - 1)
+    xi1 = np.minimum(xi + 1, width - 1)
+
+    # broadcast the row/column weights over any trailing channel axis
+    extra = image.ndim - 2
+    wy = wy.reshape((-1, 1) + (1,)*extra)
+    wx = wx.reshape((-1,) + (1,)*extra)
+
+    # four gathers and a weighted sum, in float32
+    img = np.asarray(image, dtype=np.float32)
+    row0, row1 = img[yi], img[yi1]
+    top = row0[:, xi]*(1 - wx) + row0[:, xi1]*wx
+    bottom = row1[:, xi]*(1 - wx) + row1[:, xi1]*wx
+    resized = top*(1 - wy) + bottom*wy
+
+    if image.dtype == np.uint8:
+        return np.rint(resized, out=resized).astype(np.uint8)
+    return resized
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _asinh_convert_kernel(image_r, image_g, image_b, min_r, min_g, min_b,
+                              soften, slope, pixmax, out):
+        """
+        Fused single-pass equivalent of `AsinhMapping._convert_images_to_uint8`.
+
+        Each pixel is read and written exactly once, into the packed
+        (H, W, 3) uint8 ``out``, instead of the ~10 whole-image passes
+        (and as many temporaries) that the generic numpy implementation
+        makes.
+        """
+        # float32 constants, so float32 input stays single precision throughout
+        zero = np.float32(0.0)
+        one_third = np.float32(1.0/3.0)
+
+        for i in prange(image_r.shape[0]):
+            for j in range(image_r.shape[1]):
+                r = image_r[i, j] - min_r
+                g = image_g[i, j] - min_g
+                b = image_b[i, j] - min_b
+
+                I = (r + g + b)*one_third
+                if I > zero:
+                    fac = np.arcsinh(I*soften)*slope/I
+                else:
+                    fac = zero
+
+                r = max(r*fac, zero)
+                g = max(g*fac, zero)
+                b = max(b*fac, zero)
+
+                # preserve the hue of saturated pixels by rescaling all
+                # three bands by the brightest one
+                m = max(r, max(g, b))
+                if m >= pixmax:
+                    scale = pixmax/m
+                    r *= scale
+                    g *= scale
+                    b *= scale
+
+                out[i, j, 0] = np.uint8(min(r, pixmax))
+                out[i, j, 1] = np.uint8(min(g, pixmax))
+                out[i, j, 2] = np.uint8(min(b, pixmax))
+
+
+def compute_intensity(image_r, image_g=None, image_b=None, out=None):
     """
     Return a naive total intensity from the red, blue, and green intensities.
 
@@ -28,6 +210,9 @@ def compute_intensity(image_r, image_g=None, image_b=None):
         Intensity of image to be mapped to green.
     image_b : `~numpy.ndarray`, optional
         Intensity of image to be mapped to blue.
+    out : `~numpy.ndarray`, optional
+        Preallocated array to compute the intensity into, avoiding a
+        temporary; determines the output dtype.
 
     Returns
     -------
@@ -39,12 +224,25 @@ def compute_intensity(image_r, image_g=None, image_b=None):
         if not (image_g is None and image_b is None):
             raise ValueError("please specify either a single image "
                              "or red, green, and blue images.")
+        if out is not None:
+            np.copyto(out, image_r)
+            return out
         return image_r
 
-    intensity = (image_r + image_g + image_b)/3.0
+    if out is None:
+        if image_r.dtype == np.float32:
+            # multiply is cheaper than divide, and avoids promoting to float64
+            intensity = (image_r + image_g + image_b)*np.float32(1.0/3.0)
+        else:
+            intensity = (image_r + image_g + image_b)/3.0
+
+        # Repack into whatever type was passed to us
+        return np.asarray(intensity, dtype=image_r.dtype)
 
-    # Repack into whatever type was passed to us
-    return np.asarray(intensity, dtype=image_r.dtype)
+    np.add(image_r, image_g, out=out)
+    np.add(out, image_b, out=out)
+    out *= 1.0/3.0
+    return out
 
 
 class Mapping(object):
@@ -72,10 +270,14 @@ class Mapping(object):
         self.minimum = minimum
         self._image = np.asarray(image)
 
-    def make_rgb_image(self, image_r, image_g, image_b):
+    def make_rgb_image(self, image_r, image_g, image_b,
+                       x_size=None, y_size=None, rescale=None):
         """
         Convert 3 arrays, image_r, image_g, and image_b into an 8-bit RGB image.
 
+        If the inputs are cupy arrays, the conversion runs on the GPU and a
+        GPU-resident cupy array is returned.
+
         Parameters
         ----------
         image_r : `~numpy.ndarray`
@@ -84,23 +286,46 @@ class Mapping(object):
             Image to map to green.
         image_b : `~numpy.ndarray`
             Image to map to blue.
+        x_size : int, optional
+            Desired width of the output image (the height is set to preserve
+            the aspect ratio if ``y_size`` is not also given).
+        y_size : int, optional
+            Desired height of the output image.
+        rescale : float, optional
+            Scale factor to apply to both dimensions (may not be combined
+            with ``x_size``/``y_size``).
 
         Returns
         -------
         RGBimage : `~numpy.ndarray`
             RGB (integer, 8-bits per channel) color image as an NxNx3 numpy array.
         """
-        image_r = np.asarray(image_r)
-        image_g = np.asarray(image_g)
-        image_b = np.asarray(image_b)
+        if not _is_gpu_array(image_r):
+            # the conversion works in float32 anyway, so coerce once here;
+            # contiguous float32 input passes through untouched
+            image_r = _as_float32(image_r)
+            image_g = _as_float32(image_g)
+            image_b = _as_float32(image_b)
 
         if (image_r.shape != image_g.shape) or (image_g.shape != image_b.shape):
             msg = "The image shapes must match. r: {}, g: {} b: {}"
             raise ValueError(msg.format(image_r.shape, image_g.shape, image_b.shape))
 
-        return np.dstack(self._convert_images_to_uint8(image_r, image_g, image_b)).astype(np.uint8)
+        # the conversion writes each channel straight into a packed
+        # (H, W, 3) uint8 image, with no dstack or astype copies
+        result = self._convert_images_to_uint8(image_r, image_g, image_b)
+
+        if x_size is not None or y_size is not None or rescale is not None:
+            if _is_gpu_array(result):
+                raise ValueError("rescaling is not supported for "
+                                 "GPU-resident images.")
+            # resample the packed RGB image in one call, so the bilinear
+            # geometry is only computed once rather than per band
+            result = _resize_image(result, x_size, y_size, rescale)
 
-    def intensity(self, image_r, image_g, image_b):
+        return result
+
+    def intensity(self, image_r, image_g, image_b, out=None):
         """
         Return the total intensity from the red, blue, and green intensities.
         This is a naive computation, and may be overridden by subclasses.
@@ -114,6 +339,8 @@ class Mapping(object):
             Intensity of image to be mapped to green.
         image_b : `~numpy.ndarray`, optional
             Intensity of image to be mapped to blue.
+        out : `~numpy.ndarray`, optional
+            Preallocated array to compute the intensity into.
 
         Returns
         -------
@@ -121,9 +348,9 @@ class Mapping(object):
             Total intensity from the red, blue and green intensities, or
             ``image_r`` if green and blue images are not provided.
         """
-        return compute_intensity(image_r, image_g, image_b)
+        return compute_intensity(image_r, image_g, image_b, out=out)
 
-    def map_intensity_to_uint8(self, I):
+    def map_intensity_to_uint8(self, I, out=None):
         """
         Return an array which, when multiplied by an image, returns that image
         mapped to the range of a uint8, [0, 255] (but not converted to uint8).
@@ -135,6 +362,9 @@ class Mapping(object):
         ----------
         I : `~numpy.ndarray`
             Intensity to be mapped.
+        out : `~numpy.ndarray`, optional
+            Preallocated array to compute the mapping into; must not alias
+            ``I``.
 
         Returns
         -------
@@ -142,38 +372,129 @@ class Mapping(object):
             ``I`` mapped to uint8
         """
         with np.errstate(invalid='ignore', divide='ignore'):
-            return np.clip(I, 0, self._uint8Max)
-
-    def _convert_images_to_uint8(self, image_r, image_g, image_b):
-        """Use the mapping to convert images image_r, image_g, and image_b to a triplet of uint8 images"""
-        image_r = image_r - self.minimum[0]  # n.b. makes copy
-        image_g = image_g - self.minimum[1]
-        image_b = image_b - self.minimum[2]
+            return np.clip(I, 0, self._uint8Max, out=out)
 
-        fac = self.map_intensity_to_uint8(self.intensity(image_r, image_g, image_b))
+    def _map_intensity_to_uint8_xp(self, xp, I):
+        """Array-module-generic map_intensity_to_uint8, for the cupy path."""
+        return xp.clip(I, 0, self._uint8Max)
 
-        image_rgb = [image_r, image_g, image_b]
-        for c in image_rgb:
-            c *= fac
-            c[c < 0] = 0                # individual bands can still be < 0, even if fac isn't
+    def _convert_images_to_uint8_gpu(self, image_r, image_g, image_b, out=None):
+        """
+        CuPy version of _convert_images_to_uint8 for GPU-resident images.
 
+        The arithmetic mirrors the numpy implementation, but whole-array:
+        the device supplies the parallelism, so there is no row blocking
+        and no host thread pool.
+        """
+        if out is None:
+            out = cupy.empty(image_r.shape + (3,), dtype=cupy.uint8)
         pixmax = self._uint8Max
-        r0, g0, b0 = image_rgb           # copies -- could work row by row to minimise memory usage
-
-        with np.errstate(invalid='ignore', divide='ignore'):  # n.b. np.where can't and doesn't short-circuit
-            for i, c in enumerate(image_rgb):
-                c = np.where(r0 > g0,
-                             np.where(r0 > b0,
-                                      np.where(r0 >= pixmax, c*pixmax/r0, c),
-                                      np.where(b0 >= pixmax, c*pixmax/b0, c)),
-                             np.where(g0 > b0,
-                                      np.where(g0 >= pixmax, c*pixmax/g0, c),
-                                      np.where(b0 >= pixmax, c*pixmax/b0, c))).astype(np.uint8)
-                c[c > pixmax] = pixmax
 
-                image_rgb[i] = c
+        img = cupy.empty(image_r.shape + (3,), dtype=cupy.float32)
+        img[..., 0] = image_r
+        img[..., 1] = image_g
+        img[..., 2] = image_b
+        img -= cupy.asarray(self.minimum, dtype=cupy.float32)
+
+        I = img.mean(axis=-1)
+        fac = self._map_intensity_to_uint8_xp(cupy, I)
+        img *= fac[..., None]
+        cupy.clip(img, 0, None, out=img)
+
+        # preserve the hue of saturated pixels by rescaling all three bands
+        # by the brightest one (division by a zero maximum gives inf, which
+        # the minimum then replaces with 1)
+        scale = cupy.minimum(pixmax/img.max(axis=-1), 1.0)
+        img *= scale[..., None]
+        cupy.clip(img, 0, pixmax, out=img)
+
+        out[...] = img.astype(cupy.uint8)
+        return out
+
+    def _convert_images_to_uint8(self, image_r, image_g, image_b, out=None):
+        """Use the mapping to convert images image_r, image_g, and image_b to a packed RGB uint8 image"""
+        if _is_gpu_array(image_r):
+            return self._convert_images_to_uint8_gpu(image_r, image_g, image_b, out=out)
+
+        if out is None:
+            out = np.empty(image_r.shape + (3,), dtype=np.uint8)
+
+        # bind the per-block lookups to locals once; convert_rows runs many
+        # times per image (and concurrently, under the thread pool)
+        pixmax = self._uint8Max
+        min_r, min_g, min_b = self.minimum
+        intensity = self.intensity
+        map_intensity_to_uint8 = self.map_intensity_to_uint8
+        n_rows = image_r.shape[0]
+
+        def make_bufs(n):
+            # a packed (rows, ..., 3) pixel buffer plus intensity and fac
+            # scratch: single precision is ample for a uint8 result, and a
+            # block's worth of scratch stays in cache through the whole
+            # chain of passes below
+            return [np.empty((n,) + image_r.shape[1:] + (3,), dtype=np.float32),
+                    np.empty((n,) + image_r.shape[1:], dtype=np.float32),
+                    np.empty((n,) + image_r.shape[1:], dtype=np.float32)]
+
+        def convert_rows(row, end, bufs=None):
+            n = end - row
+            if bufs is None:
+                bufs = make_bufs(n)
+            img = bufs[0][:n]
+            I = bufs[1][:n]
+            fac = bufs[2][:n]
+
+            # stack the bands into interleaved pixels while subtracting the
+            # minima; every pass below is then one contiguous walk, and the
+            # final store matches the packed layout of the output
+            np.subtract(image_r[row:end], min_r, out=img[..., 0])
+            np.subtract(image_g[row:end], min_g, out=img[..., 1])
+            np.subtract(image_b[row:end], min_b, out=img[..., 2])
+
+            intensity(img[..., 0], img[..., 1], img[..., 2], out=I)
+            m = map_intensity_to_uint8(I, out=fac)
+
+            np.multiply(img, m[..., np.newaxis], out=img)
+            # individual bands can still be < 0, even if fac isn't;
+            # clip is a single fused kernel, with no mask allocation
+            np.clip(img, 0, None, out=img)
+
+            # typical astronomical images have few saturated pixels; when
+            # nothing in this block reaches pixmax the hue-preserving
+            # rescale below is an identity, so store the block and skip it
+            # (a NaN maximum fails this test and takes the general path)
+            if img.max() < pixmax:
+                out[row:end] = img      # assignment truncates, as astype did
+                return
+
+            # preserve the hue of saturated pixels by rescaling all three
+            # bands by the brightest one: scale = pixmax/max(r, g, b) where
+            # that maximum exceeds pixmax, 1 elsewhere; fac has been
+            # consumed, so reuse it as the scale buffer
+            with np.errstate(invalid='ignore', divide='ignore'):
+                img.max(axis=-1, out=m)
+                np.reciprocal(m, out=m)
+                np.multiply(m, pixmax, out=m)
+                np.minimum(m, 1.0, out=m)
+
+                np.multiply(img, m[..., np.newaxis], out=img)
+                np.clip(img, 0, pixmax, out=img)
+                out[row:end] = img      # assignment truncates, as astype did
+
+        rows = range(0, n_rows, _TILE_NROWS)
+        if HAS_FUTURES and image_r.size >= _PARALLEL_MIN_PIXELS and len(rows) > 1:
+            # the blocks are independent and numpy's ufuncs release the GIL,
+            # so dispatch them across a thread pool; each block allocates
+            # its own scratch
+            with ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
+                list(executor.map(
+                    lambda row: convert_rows(row, min(row + _TILE_NROWS, n_rows)), rows))
+        else:
+            bufs = make_bufs(min(_TILE_NROWS, n_rows))
+            for row in rows:
+                convert_rows(row, min(row + _TILE_NROWS, n_rows), bufs)
 
-        return image_rgb
+        return out
 
 
 class LinearMapping(Mapping):
@@ -211,10 +532,24 @@ class LinearMapping(Mapping):
                 raise ValueError("minimum and maximum values must not be equal")
             self._range = float(maximum - minimum)
 
-    def map_intensity_to_uint8(self, I):
-        with np.errstate(invalid='ignore', divide='ignore'):  # n.b. np.where can't and doesn't short-circuit
-            return np.where(I <= 0, 0,
-                            np.where(I >= self._range, self._uint8Max/I, self._uint8Max/self._range))
+    def map_intensity_to_uint8(self, I, out=None):
+        if out is None:
+            out = np.empty(I.shape, dtype=np.result_type(I.dtype, np.float32))
+
+        # uint8Max/max(I, range) is uint8Max/range below range and
+        # uint8Max/I above it, with no per-pixel branching or masks
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.maximum(I, self._range, out=out)
+            np.reciprocal(out, out=out)
+            out *= self._uint8Max
+            out[I <= 0] = 0
+
+        return out
+
+    def _map_intensity_to_uint8_xp(self, xp, I):
+        out = self._uint8Max/xp.maximum(I, self._range)
+        out[I <= 0] = 0
+        return out
 
 
 class AsinhMapping(Mapping):
@@ -250,13 +585,86 @@ class AsinhMapping(Mapping):
                 Q = Qmax
 
         frac = 0.1                  # gradient estimated using frac*stretch is _slope
-        self._slope = frac*self._uint8Max/np.arcsinh(frac*Q)
-
-        self._soften = Q/float(stretch)
-
-    def map_intensity_to_uint8(self, I):
-        with np.errstate(invalid='ignore', divide='ignore'):  # n.b. np.where can't and doesn't short-circuit
-            return np.where(I <= 0, 0, np.arcsinh(I*self._soften)*self._slope/I)
+        self._slope = np.float32(frac*self._uint8Max/np.arcsinh(frac*Q))
+
+        self._soften = np.float32(Q/float(stretch))
+
+        # tabulate fac(I) = arcsinh(I*soften)*slope/I so that
+        # map_intensity_to_uint8 can replace a transcendental per pixel
+        # with a table lookup. The table is bounded in the scaled variable
+        # I*soften, where the function's curvature lives, so the bin width
+        # (and hence the interpolation error) is independent of Q; pixels
+        # brighter than _lut_max take the exact expression instead.
+        slope = float(self._slope)
+        soften = float(self._soften)
+        lut_max = _ASINH_LUT_UMAX/soften
+        lut_x = np.linspace(0.0, lut_max, _ASINH_LUT_SIZE)
+        with np.errstate(invalid='ignore'):
+            lut = np.arcsinh(lut_x*soften)*slope/lut_x
+        lut[0] = slope*soften       # the I -> 0 limit
+        self._lut = lut.astype(np.float32)
+        self._lut_max = np.float32(lut_max)
+        self._lut_scale = np.float32((_ASINH_LUT_SIZE - 1)/lut_max)
+
+    def map_intensity_to_uint8(self, I, out=None):
+        if out is None:
+            # arcsinh promotes integer input to float; match that here
+            out = np.empty(I.shape, dtype=np.result_type(I.dtype, np.float32))
+
+        if HAS_NUMEXPR and I.size >= _PARALLEL_MIN_PIXELS:
+            # one fused, multithreaded pass over the whole array. Only
+            # worth it for large direct calls: the tiled conversion path
+            # keeps the table below, which wins on cache-resident blocks
+            # and doesn't fight the block thread pool.
+            soften, slope = self._soften, self._slope  # noqa
+            zero = np.float32(0)  # noqa
+            numexpr.evaluate('where(I > 0, arcsinh(I*soften)*slope/I, zero)',
+                             out=out, casting='same_kind')
+            return out
+
+        # linearly interpolate fac from the table built in __init__
+        lut = self._lut
+        w = np.multiply(I, self._lut_scale, dtype=np.float32)
+        np.clip(w, 0, _ASINH_LUT_SIZE - 2, out=w)
+        # NaN intensities are NaN in the bands too, so any finite fac will do
+        np.copyto(w, 0, where=np.isnan(w))
+        idx = w.astype(np.int32)
+        np.subtract(w, idx, out=w)  # fractional part
+
+        lo = lut[idx]
+        hi = lut[idx + 1]
+        np.subtract(hi, lo, out=hi)
+        np.multiply(hi, w, out=hi)
+        np.add(lo, hi, out=out)
+
+        # the table only covers I <= _lut_max; the (typically few) pixels
+        # brighter than that get the exact expression
+        above = I > self._lut_max
+        if above.any():
+            I_above = np.asarray(I[above], dtype=np.float32)
+            out[above] = np.arcsinh(I_above*self._soften)*self._slope/I_above
+
+        out[I <= 0] = 0
+
+        return out
+
+    def _map_intensity_to_uint8_xp(self, xp, I):
+        fac = xp.arcsinh(I*self._soften)*self._slope/I
+        return xp.where(I <= 0, I.dtype.type(0), fac)
+
+    def _convert_images_to_uint8(self, image_r, image_g, image_b, out=None):
+        if HAS_NUMBA and isinstance(image_r, np.ndarray) and image_r.ndim == 2:
+            if out is None:
+                out = np.empty(image_r.shape + (3,), dtype=np.uint8)
+            _asinh_convert_kernel(
+                np.asarray(image_r, dtype=np.float32), np.asarray(image_g, dtype=np.float32),
+                np.asarray(image_b, dtype=np.float32),
+                np.float32(self.minimum[0]), np.float32(self.minimum[1]),
+                np.float32(self.minimum[2]),
+                self._soften, self._slope, np.float32(self._uint8Max), out)
+            return out
+
+        return Mapping._convert_images_to_uint8(self, image_r, image_g, image_b, out=out)
 
 
 class AsinhZScaleMapping(AsinhMapping):
@@ -305,15 +713,23 @@ class AsinhZScaleMapping(AsinhMapping):
 
             if len(pedestal) != 3:
                 raise ValueError("please provide 1 or 3 pedestals.")
-
-            image = list(image)        # needs to be mutable
-            for i, im in enumerate(image):
-                if pedestal[i] != 0.0:
-                    image[i] = im - pedestal[i]  # n.b. a copy
         else:
             pedestal = len(image)*[0.0]
 
-        image = compute_intensity(*image)
+        if len(image) == 3:
+            # stack the bands and remove the pedestals in one broadcast
+            # subtract, then fold the intensity mean along the stack axis,
+            # instead of up to three Python-loop copies followed by
+            # another full pass in compute_intensity
+            stack = np.stack([np.asarray(im, dtype=np.float32) for im in image])
+            if any(pedestal):
+                stack -= np.asarray(pedestal, dtype=np.float32).reshape(
+                    (-1,) + (1,)*(stack.ndim - 1))
+            image = stack.mean(axis=0)
+        else:
+            image = image[0]
+            if pedestal[0] != 0.0:
+                image = image - pedestal[0]  # n.b. a copy
 
         zscale_limits = ZScaleInterval().get_limits(image)
         zscale = LinearMapping(*zscale_limits, image=image)
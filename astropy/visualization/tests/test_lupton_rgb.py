@@ -171,6 +171,48 @@ class TestLuptonRgb(object):
         if display:
             display_rgb(rgbImage, title=sys._getframe().f_code.co_name)
 
+    def test_Asinh_rescale(self):
+        """Test creating a rescaled RGB image using an asinh stretch"""
+        asinhMap = lupton_rgb.AsinhMapping(self.min_, self.stretch_, self.Q)
+        rgbImage = asinhMap.make_rgb_image(self.image_r, self.image_g, self.image_b,
+                                           rescale=0.5)
+        assert rgbImage.shape == (self.width//2, self.height//2, 3)
+        if display:
+            display_rgb(rgbImage, title=sys._getframe().f_code.co_name)
+
+    def test_Asinh_matches_exact_expression(self, monkeypatch):
+        """Test the pure-numpy conversion against the exact asinh expression
+
+        With numba or numexpr installed make_rgb_image never reaches the
+        lookup-table branch, so force them off to exercise it.
+        """
+        monkeypatch.setattr(lupton_rgb, 'HAS_NUMBA', False)
+        monkeypatch.setattr(lupton_rgb, 'HAS_NUMEXPR', False)
+
+        pixmax = 255.0
+        for Q in (8, 20, 30):
+            asinhMap = lupton_rgb.AsinhMapping(self.min_, self.stretch_, Q)
+            rgbImage = asinhMap.make_rgb_image(self.image_r, self.image_g, self.image_b)
+
+            bands = [np.asarray(image, dtype=float) - minimum
+                     for image, minimum in zip((self.image_r, self.image_g, self.image_b),
+                                               asinhMap.minimum)]
+            intensity = (bands[0] + bands[1] + bands[2])/3.0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                fac = np.where(intensity <= 0, 0.0,
+                               np.arcsinh(intensity*float(asinhMap._soften)) *
+                               float(asinhMap._slope)/intensity)
+            bands = [np.clip(c*fac, 0, None) for c in bands]
+            peak = np.maximum(np.maximum(bands[0], bands[1]), bands[2])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scale = np.where(peak >= pixmax, pixmax/peak, 1.0)
+            expected = np.dstack([np.clip(c*scale, 0, pixmax)
+                                  for c in bands]).astype(np.uint8)
+
+            # float32 vs float64 rounding can move a pixel by one level
+            diff = np.abs(rgbImage.astype(int) - expected.astype(int))
+            assert diff.max() <= 1, "Q={0}: max diff {1}".format(Q, diff.max())
+
     @pytest.mark.skipif('not HAS_MATPLOTLIB')
     def test_make_rgb(self):
         """Test the function that does it all"""